@@ -1,102 +1,156 @@
 #!/usr/bin/env python3
 """
-Flask API Wrapper for ClipsAI Video Processing Pipeline
+Quart API Wrapper for ClipsAI Video Processing Pipeline
 Integrates with n8n workflow automation
+
+Serve with:
+    gunicorn -c gunicorn_conf.py app:app
+and start pipeline workers with:
+    python3 worker.py
 """
 
-from flask import Flask, request, jsonify, send_file
-from flask_cors import CORS
-import os
-import subprocess
+from quart import Quart, Response, request, jsonify, send_file, make_response
+from quart_cors import cors
+import asyncio
 import json
-from pathlib import Path
-from typing import Dict, List, Optional
+import mimetypes
+from typing import Dict
+from urllib.parse import quote
 import logging
+import math
 from datetime import datetime
 
+from redis import Redis
+from rq import Queue
+from rq.exceptions import NoSuchJobError
+from rq.job import Job, JobStatus
+
+from pipeline_utils import (
+    ACCEL_REDIRECT_PREFIX,
+    CLIPS_DIR,
+    DESIGNED_DIR,
+    PYANNOTE_TOKEN,
+    REDIS_URL,
+    SUBTITLED_DIR,
+    VIDEOS_DIR,
+    cached_list_directory_files,
+    ensure_media_dirs,
+    invalidate_listing_cache,
+    remove_files,
+)
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
-CORS(app)  # Enable CORS for n8n requests
-
-# ========= Configuration =========
-PROJECT_DIR = Path("/home/michael_adegoke/clipsai")
-BASE_DIR = Path("/home/michael_adegoke")
-VIDEOS_DIR = BASE_DIR / "videos"
-CLIPS_DIR = BASE_DIR / "clips"
-SUBTITLED_DIR = BASE_DIR / "subtitled"
-DESIGNED_DIR = BASE_DIR / "designed"
+app = Quart(__name__)
+app = cors(app)  # Enable CORS for n8n requests
 
 # Ensure directories exist
-for dir_path in [VIDEOS_DIR, CLIPS_DIR, SUBTITLED_DIR, DESIGNED_DIR]:
-    dir_path.mkdir(parents=True, exist_ok=True)
+ensure_media_dirs()
 
-# Environment variables
-PYANNOTE_TOKEN = os.environ.get("PYANNOTE_AUTH_TOKEN", "")
-COOKIES_PATH = os.environ.get("CLIPSAI_COOKIES", str(BASE_DIR / "cookies.txt"))
+# ========= Job Queue =========
+# Pipeline steps run in RQ workers (see pipeline_tasks.py), so requests return
+# immediately with a job_id instead of holding the connection for minutes
+JOB_TIMEOUT = 3600
+RESULT_TTL = 24 * 3600
+PROGRESS_POLL_INTERVAL = 1.0
+
+redis_conn = Redis.from_url(REDIS_URL)
+queue = Queue("clipsai", connection=redis_conn)
+_last_job_ended_at = None
 
 
 # ========= Helper Functions =========
-def run_script(script_name: str, args: List[str] = None, input_data: str = None) -> Dict:
-    """Execute a Python script and return results"""
-    try:
-        script_path = PROJECT_DIR / script_name
-        cmd = ["python3", str(script_path)]
-        if args:
-            cmd.extend(args)
-        
-        logger.info(f"Executing: {' '.join(cmd)}")
-        
-        result = subprocess.run(
-            cmd,
-            input=input_data,
-            capture_output=True,
-            text=True,
-            cwd=PROJECT_DIR
-        )
-        
-        return {
-            "success": result.returncode == 0,
-            "stdout": result.stdout,
-            "stderr": result.stderr,
-            "returncode": result.returncode
-        }
-    except Exception as e:
-        logger.error(f"Error executing {script_name}: {str(e)}")
-        return {
-            "success": False,
-            "error": str(e)
-        }
+async def enqueue_job(task_name: str, *args) -> Job:
+    """Enqueue a pipeline_tasks function by name (keeps models out of the web tier)"""
+    job = await asyncio.to_thread(
+        queue.enqueue,
+        f"pipeline_tasks.{task_name}",
+        *args,
+        job_timeout=JOB_TIMEOUT,
+        result_ttl=RESULT_TTL,
+        failure_ttl=RESULT_TTL
+    )
+    logger.info(f"Enqueued {task_name} as job {job.id}")
+    return job
+
+
+async def fetch_job(job_id: str) -> Job:
+    """Job.fetch off the event loop (raises NoSuchJobError)"""
+    return await asyncio.to_thread(Job.fetch, job_id, connection=redis_conn)
+
+
+def job_accepted(job: Job):
+    """202 response pointing the client at the job status endpoints"""
+    return jsonify({
+        "status": "queued",
+        "job_id": job.id,
+        "status_url": f"/jobs/{job.id}",
+        "progress_url": f"/progress/{job.id}"
+    }), 202
 
 
-def get_file_info(file_path: Path) -> Dict:
-    """Get file metadata"""
-    if not file_path.exists():
-        return None
-    
+def design_params(data: Dict) -> Dict:
+    """
+    Design settings from a request body, with the documented defaults
+
+    Raises ValueError if crop_expansion is not a positive number
+    """
+    value = data.get('crop_expansion', 3.0)
+    try:
+        # bool is an int subclass, but `true` is not a factor
+        crop_expansion = 0.0 if isinstance(value, bool) else float(value)
+    except (TypeError, ValueError):
+        crop_expansion = 0.0
+    if not 0 < crop_expansion < math.inf:  # also rejects NaN
+        raise ValueError("'crop_expansion' must be a positive number")
     return {
-        "filename": file_path.name,
-        "path": str(file_path),
-        "size_mb": round(file_path.stat().st_size / (1024 * 1024), 2),
-        "modified": datetime.fromtimestamp(file_path.stat().st_mtime).isoformat()
+        "video_id": data.get('video_id', 'default'),
+        "crop_expansion": crop_expansion,
+        "disable_smart_crop": data.get('disable_smart_crop', False),
+        "use_subtitles": data.get('use_subtitles', True)
     }
 
 
-def list_directory_files(directory: Path, pattern: str = "*") -> List[Dict]:
-    """List files in directory with metadata"""
-    files = []
-    for file_path in sorted(directory.glob(pattern)):
-        if file_path.is_file():
-            files.append(get_file_info(file_path))
-    return files
+def note_job_ended(job: Job) -> None:
+    """Drop cached listings once per newly ended job (a worker wrote its outputs)"""
+    global _last_job_ended_at
+    if job.ended_at and (
+        _last_job_ended_at is None or job.ended_at > _last_job_ended_at
+    ):
+        _last_job_ended_at = job.ended_at
+        invalidate_listing_cache()
+
+
+async def get_job_payload(job: Job) -> Dict:
+    """Current status, progress and outcome of a job"""
+    # redis-py blocks, so its round trips run off the event loop
+    await asyncio.to_thread(job.refresh)  # one round trip for status, meta and ended_at
+    status = job.get_status(refresh=False)
+    meta = job.meta
+    payload = {
+        "job_id": job.id,
+        "status": status.value,
+        "progress": meta.get("progress")
+    }
+    if status in (JobStatus.FINISHED, JobStatus.FAILED):
+        note_job_ended(job)
+    if status == JobStatus.FINISHED:
+        payload["result"] = await asyncio.to_thread(job.return_value)
+    elif status == JobStatus.FAILED:
+        # Step failures carry the same error/details body the endpoints used to return
+        exc_info = (job.exc_info or "").strip()
+        payload["error"] = meta.get("error") or (
+            exc_info.splitlines()[-1] if exc_info else "Job failed"
+        )
+    return payload
 
 
 # ========= API Endpoints =========
 
 @app.route('/health', methods=['GET'])
-def health_check():
+async def health_check():
     """Health check endpoint"""
     return jsonify({
         "status": "healthy",
@@ -112,7 +166,7 @@ def health_check():
 
 
 @app.route('/process-video', methods=['POST'])
-def process_video():
+async def process_video():
     """
     Step 1: Download YouTube video and create clips using quicktest.py
     
@@ -123,43 +177,15 @@ def process_video():
     }
     """
     try:
-        data = request.json
+        data = await request.get_json(silent=True) or {}
         video_url = data.get('url')
         video_id = data.get('video_id', 'default')
         
         if not video_url:
             return jsonify({"error": "Missing 'url' parameter"}), 400
         
-        logger.info(f"Processing video: {video_url}")
-        
-        # Clean up previous clips
-        for old_clip in CLIPS_DIR.glob("clip_*.mp4"):
-            old_clip.unlink()
-        
-        # Run quicktest.py with video URL as input
-        result = run_script("quicktest.py", input_data=f"{video_url}\n")
-        
-        if not result["success"]:
-            return jsonify({
-                "error": "Video processing failed",
-                "details": result["stderr"]
-            }), 500
-        
-        # Get generated clips
-        clips = list_directory_files(CLIPS_DIR, "clip_*.mp4")
-        
-        # Get downloaded video info
-        downloaded_video = list(VIDEOS_DIR.glob("input.*"))
-        video_info = get_file_info(downloaded_video[0]) if downloaded_video else None
-        
-        return jsonify({
-            "status": "success",
-            "video_id": video_id,
-            "source_video": video_info,
-            "clips_count": len(clips),
-            "clips": clips,
-            "message": f"Generated {len(clips)} clips from video"
-        })
+        job = await enqueue_job("process_video", video_url, video_id)
+        return job_accepted(job)
         
     except Exception as e:
         logger.error(f"Error in process_video: {str(e)}")
@@ -167,49 +193,23 @@ def process_video():
 
 
 @app.route('/add-subtitles', methods=['POST'])
-def add_subtitles():
+async def add_subtitles():
     """
-    Step 2: Generate and burn subtitles using subtitles.py
+    Step 2: Generate subtitles and add them to the clips using subtitles.py
     
     Request body:
     {
-        "video_id": "unique_identifier" (optional)
+        "video_id": "unique_identifier" (optional),
+        "burn": true (optional, default: true; false writes only the SRTs.
+                      Clips get a soft subtitle track unless CLIPSAI_BURN_IN=1)
     }
     """
     try:
-        data = request.json or {}
+        data = await request.get_json(silent=True) or {}
         video_id = data.get('video_id', 'default')
         
-        logger.info("Adding subtitles to clips...")
-        
-        # Clean up previous subtitled clips
-        for old_sub in SUBTITLED_DIR.glob("*.mp4"):
-            old_sub.unlink()
-        for old_srt in SUBTITLED_DIR.glob("*.srt"):
-            old_srt.unlink()
-        
-        # Run subtitles.py
-        result = run_script("subtitles.py")
-        
-        if not result["success"]:
-            return jsonify({
-                "error": "Subtitle generation failed",
-                "details": result["stderr"]
-            }), 500
-        
-        # Get subtitled clips
-        subtitled_clips = list_directory_files(SUBTITLED_DIR, "clip_*_subtitled.mp4")
-        srt_files = list_directory_files(SUBTITLED_DIR, "*.srt")
-        
-        return jsonify({
-            "status": "success",
-            "video_id": video_id,
-            "subtitled_clips_count": len(subtitled_clips),
-            "subtitled_clips": subtitled_clips,
-            "srt_files_count": len(srt_files),
-            "srt_files": srt_files,
-            "message": f"Added subtitles to {len(subtitled_clips)} clips"
-        })
+        job = await enqueue_job("add_subtitles", video_id, data.get('burn', True))
+        return job_accepted(job)
         
     except Exception as e:
         logger.error(f"Error in add_subtitles: {str(e)}")
@@ -217,7 +217,7 @@ def add_subtitles():
 
 
 @app.route('/apply-design', methods=['POST'])
-def apply_design():
+async def apply_design():
     """
     Step 3: Apply 9:16 vertical design with template using design.py
     
@@ -230,59 +230,15 @@ def apply_design():
     }
     """
     try:
-        data = request.json or {}
-        video_id = data.get('video_id', 'default')
-        crop_expansion = data.get('crop_expansion', 3.0)
-        disable_smart_crop = data.get('disable_smart_crop', False)
-        use_subtitles = data.get('use_subtitles', True)
-        
-        logger.info("Applying vertical design to clips...")
-        
-        # Clean up previous designed clips
-        for old_design in DESIGNED_DIR.glob("*.mp4"):
-            old_design.unlink()
-        
-        # Build command arguments
-        args = [
-            "--input_dir", str(CLIPS_DIR),
-            "--output_dir", str(DESIGNED_DIR),
-            "--crop_expansion", str(crop_expansion),
-            "--pyannote_token", PYANNOTE_TOKEN
-        ]
+        data = await request.get_json(silent=True) or {}
         
-        if disable_smart_crop:
-            args.append("--disable_smart_crop")
+        try:
+            params = design_params(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
-        if use_subtitles:
-            args.extend(["--subs_mode", "auto"])
-            args.extend(["--subs_dir", str(SUBTITLED_DIR)])
-        else:
-            args.extend(["--subs_mode", "off"])
-        
-        # Run design.py
-        result = run_script("design.py", args=args)
-        
-        if not result["success"]:
-            return jsonify({
-                "error": "Design application failed",
-                "details": result["stderr"]
-            }), 500
-        
-        # Get designed clips
-        designed_clips = list_directory_files(DESIGNED_DIR, "*_vertical.mp4")
-        
-        return jsonify({
-            "status": "success",
-            "video_id": video_id,
-            "designed_clips_count": len(designed_clips),
-            "designed_clips": designed_clips,
-            "settings": {
-                "crop_expansion": crop_expansion,
-                "smart_crop_enabled": not disable_smart_crop,
-                "subtitles_enabled": use_subtitles
-            },
-            "message": f"Applied design to {len(designed_clips)} clips"
-        })
+        job = await enqueue_job("apply_design", params)
+        return job_accepted(job)
         
     except Exception as e:
         logger.error(f"Error in apply_design: {str(e)}")
@@ -290,7 +246,7 @@ def apply_design():
 
 
 @app.route('/process-complete-pipeline', methods=['POST'])
-def process_complete_pipeline():
+async def process_complete_pipeline():
     """
     All-in-one endpoint: Download → Clip → Subtitle → Design
     
@@ -304,73 +260,88 @@ def process_complete_pipeline():
     }
     """
     try:
-        data = request.json
+        data = await request.get_json(silent=True) or {}
         video_url = data.get('url')
         
         if not video_url:
             return jsonify({"error": "Missing 'url' parameter"}), 400
         
-        results = {}
-        
-        # Step 1: Process video
-        logger.info("Step 1/3: Processing video and creating clips...")
-        step1 = process_video()
-        results['step1_clips'] = step1.get_json()
-        
-        if step1.status_code != 200:
-            return step1
+        try:
+            params = design_params(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        params['video_id'] = data.get('video_id')
+        params['url'] = video_url
         
-        # Step 2: Add subtitles
-        logger.info("Step 2/3: Adding subtitles...")
-        step2 = add_subtitles()
-        results['step2_subtitles'] = step2.get_json()
-        
-        if step2.status_code != 200:
-            return step2
-        
-        # Step 3: Apply design
-        logger.info("Step 3/3: Applying vertical design...")
-        design_data = {
-            "video_id": data.get('video_id'),
-            "crop_expansion": data.get('crop_expansion', 3.0),
-            "disable_smart_crop": data.get('disable_smart_crop', False),
-            "use_subtitles": data.get('use_subtitles', True)
-        }
-        
-        # Temporarily override request.json for apply_design
-        original_json = request.json
-        request.json = design_data
-        step3 = apply_design()
-        request.json = original_json
-        
-        results['step3_design'] = step3.get_json()
-        
-        if step3.status_code != 200:
-            return step3
-        
-        return jsonify({
-            "status": "success",
-            "message": "Complete pipeline executed successfully",
-            "summary": {
-                "clips_generated": results['step1_clips']['clips_count'],
-                "subtitles_added": results['step2_subtitles']['subtitled_clips_count'],
-                "designs_created": results['step3_design']['designed_clips_count']
-            },
-            "details": results
-        })
+        job = await enqueue_job("process_complete_pipeline", params)
+        return job_accepted(job)
         
     except Exception as e:
         logger.error(f"Error in complete pipeline: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/jobs/<job_id>', methods=['GET'])
+async def job_status(job_id):
+    """
+    Poll a pipeline job
+    
+    Returns status (queued|started|finished|failed|...), the latest progress
+    message, and the step result once finished.
+    """
+    try:
+        job = await fetch_job(job_id)
+    except NoSuchJobError:
+        return jsonify({"error": "Job not found"}), 404
+    
+    try:
+        return jsonify(await get_job_payload(job))
+    except Exception as e:
+        logger.error(f"Error fetching job {job_id}: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/progress/<job_id>', methods=['GET'])
+async def job_progress(job_id):
+    """
+    Stream job progress as Server-Sent Events until the job ends
+    """
+    try:
+        job = await fetch_job(job_id)
+    except NoSuchJobError:
+        return jsonify({"error": "Job not found"}), 404
+    
+    async def stream():
+        last_payload = None
+        while True:
+            payload = await get_job_payload(job)
+            if payload != last_payload:
+                yield f"data: {json.dumps(payload)}\n\n"
+                last_payload = payload
+            if payload["status"] in {"finished", "failed", "stopped", "canceled"}:
+                break
+            await asyncio.sleep(PROGRESS_POLL_INTERVAL)
+    
+    response = await make_response(stream(), {
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache"
+    })
+    response.timeout = None  # pipelines outlive the default response timeout
+    return response
+
+
 @app.route('/download-file/<path:filename>', methods=['GET'])
-def download_file(filename):
+async def download_file(filename):
     """
     Download a processed file
     
     Query params:
     - type: clips|subtitled|designed (default: designed)
+    
+    With CLIPSAI_ACCEL_REDIRECT_PREFIX set (e.g. "/private"), the body is left to
+    nginx via X-Accel-Redirect to <prefix>/<type>/<filename>, which must map to an
+    internal location aliasing the matching directory:
+        location /private/designed/ { internal; alias /home/michael_adegoke/designed/; }
     """
     try:
         file_type = request.args.get('type', 'designed')
@@ -382,16 +353,36 @@ def download_file(filename):
             'videos': VIDEOS_DIR
         }
         
-        directory = directory_map.get(file_type, DESIGNED_DIR)
-        file_path = directory / filename
+        if file_type not in directory_map:
+            file_type = 'designed'
+        file_path = directory_map[file_type] / filename
         
         if not file_path.exists():
             return jsonify({"error": "File not found"}), 404
         
-        return send_file(
+        if ACCEL_REDIRECT_PREFIX:
+            # nginx streams the file with sendfile(2); the worker only writes headers
+            # nginx keeps the upstream Content-Type, so it has to be the file's own
+            response = Response(
+                "",
+                mimetype=mimetypes.guess_type(filename)[0] or "application/octet-stream"
+            )
+            response.headers["X-Accel-Redirect"] = quote(
+                f"{ACCEL_REDIRECT_PREFIX}/{file_type}/{filename}"
+            )
+            response.headers.add(
+                "Content-Disposition", "attachment", filename=file_path.name
+            )
+            return response
+        
+        # Quart sets an ETag and Last-Modified from the file's mtime/size, and
+        # conditional=True answers If-None-Match/If-Modified-Since with a 304
+        return await send_file(
             file_path,
             as_attachment=True,
-            download_name=filename
+            attachment_filename=filename,
+            add_etags=True,
+            conditional=True
         )
         
     except Exception as e:
@@ -400,12 +391,14 @@ def download_file(filename):
 
 
 @app.route('/list-files', methods=['GET'])
-def list_files():
+async def list_files():
     """
     List all files in processing directories
     
     Query params:
     - type: clips|subtitled|designed|all (default: all)
+    
+    Supports If-None-Match; responses carry a weak ETag.
     """
     try:
         file_type = request.args.get('type', 'all')
@@ -413,22 +406,29 @@ def list_files():
         result = {}
         
         if file_type in ['clips', 'all']:
-            result['clips'] = list_directory_files(CLIPS_DIR, "clip_*.mp4")
+            result['clips'] = cached_list_directory_files(CLIPS_DIR, "clip_*.mp4")
         
         if file_type in ['subtitled', 'all']:
-            result['subtitled'] = list_directory_files(SUBTITLED_DIR, "*_subtitled.mp4")
-            result['srt_files'] = list_directory_files(SUBTITLED_DIR, "*.srt")
+            result['subtitled'] = cached_list_directory_files(
+                SUBTITLED_DIR, "*_subtitled.mp4"
+            )
+            result['srt_files'] = cached_list_directory_files(SUBTITLED_DIR, "*.srt")
         
         if file_type in ['designed', 'all']:
-            result['designed'] = list_directory_files(DESIGNED_DIR, "*_vertical.mp4")
+            result['designed'] = cached_list_directory_files(
+                DESIGNED_DIR, "*_vertical.mp4"
+            )
         
         if file_type in ['videos', 'all']:
-            result['source_videos'] = list_directory_files(VIDEOS_DIR)
+            result['source_videos'] = cached_list_directory_files(VIDEOS_DIR)
         
-        return jsonify({
+        # Weak ETag over the listing itself; unchanged polls get an empty 304
+        response = jsonify({
             "status": "success",
             "files": result
         })
+        await response.add_etag(weak=True)
+        return await response.make_conditional(request)
         
     except Exception as e:
         logger.error(f"Error listing files: {str(e)}")
@@ -436,7 +436,7 @@ def list_files():
 
 
 @app.route('/cleanup', methods=['POST'])
-def cleanup():
+async def cleanup():
     """
     Clean up all processed files
     
@@ -446,7 +446,7 @@ def cleanup():
     }
     """
     try:
-        data = request.json or {}
+        data = await request.get_json(silent=True) or {}
         directories = data.get('directories', ['clips', 'subtitled', 'designed', 'videos'])
         
         cleaned = {}
@@ -460,15 +460,8 @@ def cleanup():
         
         for dir_name in directories:
             if dir_name in directory_map:
-                directory = directory_map[dir_name]
-                files_removed = 0
-                
-                for file_path in directory.glob("*"):
-                    if file_path.is_file():
-                        file_path.unlink()
-                        files_removed += 1
-                
-                cleaned[dir_name] = files_removed
+                cleaned[dir_name] = remove_files(directory_map[dir_name])
+                invalidate_listing_cache(directory_map[dir_name])
         
         return jsonify({
             "status": "success",
@@ -483,19 +476,11 @@ def cleanup():
 
 # ========= Error Handlers =========
 @app.errorhandler(404)
-def not_found(error):
+async def not_found(error):
     return jsonify({"error": "Endpoint not found"}), 404
 
 
 @app.errorhandler(500)
-def internal_error(error):
+async def internal_error(error):
     return jsonify({"error": "Internal server error"}), 500
 
-
-# ========= Main =========
-if __name__ == '__main__':
-    # Development server
-    app.run(host='0.0.0.0', port=5000, debug=True)
-    
-    # For production, use:
-    # gunicorn -w 4 -b 0.0.0.0:5000 --timeout 600 api:app
@@ -28,6 +28,7 @@ def resize(
     scene_merge_threshold: float = 0.25,
     time_precision: int = 6,
     device: str = None,
+    diarizer: PyannoteDiarizer = None,
 ) -> Crops:
     """
     Resizes a video to a specified aspect ratio, with default being 9:16. It involves
@@ -63,6 +64,9 @@ def resize(
     device: str
         PyTorch device to perform computations on. Ex: 'cpu', 'cuda'. Default is None
         (auto detects the correct device)
+    diarizer: PyannoteDiarizer
+        A preloaded diarizer to reuse across calls. Default is None (a new diarizer is
+        created with `pyannote_auth_token` and `device`)
 
     Returns
     -------
@@ -74,7 +78,8 @@ def resize(
     media.assert_has_video_stream()
 
     logging.debug("DIARIZING VIDEO ({})".format(media.get_filename()))
-    diarizer = PyannoteDiarizer(auth_token=pyannote_auth_token, device=device)
+    if diarizer is None:
+        diarizer = PyannoteDiarizer(auth_token=pyannote_auth_token, device=device)
     diarized_segments = diarizer.diarize(media, min_segment_duration, time_precision)
 
     logging.debug("DETECTING SCENES IN VIDEO ({})".format(media.get_filename()))
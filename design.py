@@ -1,11 +1,21 @@
 #!/usr/bin/env python3
+import argparse
+import json
+import logging
 import os
+import pickle
 import shlex
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple
 
 from clipsai import resize  # Requires your pyannote token (PYANNOTE_AUTH_TOKEN)
+from clipsai.diarize.pyannote import PyannoteDiarizer
+from pipeline_utils import encode_workers, ensure_dir, h264_encoder_args, run_command
+
+logger = logging.getLogger(__name__)
 
 # ========= Path configuration =========
 # Project root: this file lives in /home/michael_adegoke/clipsai/
@@ -44,28 +54,89 @@ CAPTION_STYLE = (
 PYANNOTE_TOKEN = os.environ.get("PYANNOTE_AUTH_TOKEN", "")
 
 # Ensure output dir exists
-OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+ensure_dir(OUTPUT_DIR)
+
+# pyannote pipelines keyed by auth token (loaded once, kept resident between runs)
+_diarizers = {}
+
+# Parallel rendering: each render is an ffmpeg subprocess, so a thread per clip
+# is enough (no fork of the warmed worker); each ffmpeg is capped to a couple of
+# threads so concurrent encodes don't oversubscribe the CPU
+FFMPEG_THREADS = 2
+DESIGN_WORKERS = int(os.environ.get(
+    "CLIPSAI_DESIGN_WORKERS", max(1, (os.cpu_count() or 2) // FFMPEG_THREADS)
+))
 
 
 # ========= Helpers =========
 def run(cmd: list):
-    """Run a subprocess, echoing the command for debugging."""
-    print("→", " ".join(shlex.quote(c) for c in cmd))
-    subprocess.run(cmd, check=True)
+    """Run a subprocess, logging the command at DEBUG level."""
+    # Only build the quoted command line when it will actually be emitted
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("→ %s", " ".join(shlex.quote(c) for c in cmd))
+    run_command(cmd)
+
+
+def get_diarizer(auth_token: str) -> PyannoteDiarizer:
+    """Return the shared pyannote diarizer for `auth_token`, loading it on first use."""
+    if auth_token not in _diarizers:
+        _diarizers[auth_token] = PyannoteDiarizer(auth_token=auth_token)
+    return _diarizers[auth_token]
+
+
+def get_video_dimensions(video_path: Path, crops=None) -> Tuple[int, int]:
+    """
+    Get video width and height. clipsai.resize() already measured the source, so
+    read them off the Crops object when given; only probe the file otherwise.
+    """
+    w = int(getattr(crops, "original_width", 0) or 0)
+    h = int(getattr(crops, "original_height", 0) or 0)
+    if w > 0 and h > 0:
+        return w, h
+    stream = probe_stream(video_path)
+    return int(stream["width"]), int(stream["height"])
 
 
-def get_video_dimensions(video_path: Path) -> Tuple[int, int]:
-    """Get video width and height using ffprobe."""
+def probe_stream(video_path: Path) -> dict:
+    """ffprobe the first video stream (width, height, avg_frame_rate, ...) per mtime."""
+    return _probe_stream(str(video_path), video_path.stat().st_mtime)
+
+
+@lru_cache(maxsize=512)
+def _probe_stream(video_path: str, mtime: float) -> dict:
     cmd = [
         "ffprobe", "-v", "error",
+        "-print_format", "json",
+        "-show_streams",
         "-select_streams", "v:0",
-        "-show_entries", "stream=width,height",
-        "-of", "csv=p=0",
-        str(video_path)
+        video_path
     ]
     result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-    w, h = map(int, result.stdout.strip().split(','))
-    return w, h
+    return json.loads(result.stdout)["streams"][0]
+
+
+def get_crops(clip: Path, pyannote_token: str):
+    """
+    Run clipsai.resize() on a clip, reusing the pickled result from a previous run
+    (clip_N.crops.pkl) while it is at least as new as the clip.
+    """
+    cache = clip.with_suffix(".crops.pkl")
+    if cache.exists() and cache.stat().st_mtime >= clip.stat().st_mtime:
+        try:
+            with open(cache, "rb") as f:
+                return pickle.load(f)
+        except Exception as e:
+            print(f"[warn] Ignoring unreadable crop cache {cache.name}: {e}")
+
+    crops = resize(
+        video_file_path=str(clip),
+        pyannote_auth_token=pyannote_token,
+        aspect_ratio=(9, 16),
+        diarizer=get_diarizer(pyannote_token)
+    )
+    with open(cache, "wb") as f:
+        pickle.dump(crops, f)
+    return crops
 
 
 def expand_crop_box(
@@ -123,6 +194,7 @@ def pick_primary_crop(crops_obj) -> Optional[Tuple[int, int, int, int]]:
     return (x, y, w, h) if min(w, h) > 0 else None
 
 
+@lru_cache(maxsize=256)
 def escape_for_subtitles(path: Path) -> str:
     """
     Escape SRT path for ffmpeg's subtitles filter (libass).
@@ -137,6 +209,39 @@ def escape_for_subtitles(path: Path) -> str:
     )
 
 
+# Constant filtergraph pieces, built once instead of per clip
+_STYLE_ESCAPED = CAPTION_STYLE.replace(",", "\\,")
+_SMART_CROP = "[0:v]crop=%d:%d:%d:%d[fg]"
+# Center 9:16 crop (escapes commas for ffmpeg 4.x)
+_CENTER_CROP = (
+    "[0:v]"
+    "crop="
+    "iw*min(1.0\\,ih/iw*9/16):"
+    "ih*min(1.0\\,iw/ih*16/9):"
+    "(iw - iw*min(1.0\\,ih/iw*9/16))/2:"
+    "(ih - ih*min(1.0\\,iw/ih*16/9))/2[fg]"
+)
+
+
+@lru_cache(maxsize=16)
+def _canvas_graph(out_w: int, out_h: int) -> Tuple[str, str]:
+    """(background, fit-and-composite) sub-graphs, which depend only on the canvas."""
+    # Background: scale-to-cover → blur → crop
+    background = (
+        f"[0:v]"
+        f"scale='if(gte(iw/ih,{out_w}/{out_h}),-1,{out_w})'"
+        f":'if(gte(iw/ih,{out_w}/{out_h}),{out_h},-1)',"
+        f"boxblur=24:1,"
+        f"crop={out_w}:{out_h}[bg]"
+    )
+    # Fit FG to canvas, keep AR; composite over blurred BG
+    composite = (
+        f"[fg]scale={out_w}:{out_h}:force_original_aspect_ratio=decrease[fgs],"
+        "[bg][fgs]overlay=(W-w)/2:(H-h)/2[base]"
+    )
+    return background, composite
+
+
 def build_filtergraph(
     crop_box: Optional[Tuple[int, int, int, int]],
     out_w: int,
@@ -150,42 +255,26 @@ def build_filtergraph(
       - Optional: burn subtitles (with escaped force_style)
       - Overlay PNG template on top
     """
-    parts = []
-
-    # Background: scale-to-cover → blur → crop
-    parts.append(
-        f"[0:v]"
-        f"scale='if(gte(iw/ih,{out_w}/{out_h}),-1,{out_w})'"
-        f":'if(gte(iw/ih,{out_w}/{out_h}),{out_h},-1)',"
-        f"boxblur=24:1,"
-        f"crop={out_w}:{out_h}[bg]"
-    )
+    background, composite = _canvas_graph(out_w, out_h)
+    parts = [background]
 
     # Foreground crop (smart or center 9:16)
     if crop_box and all(v > 0 for v in crop_box):
         x, y, w, h = crop_box
-        parts.append(f"[0:v]crop={w}:{h}:{x}:{y}[fg]")
+        parts.append(_SMART_CROP % (w, h, x, y))
     else:
-        # Center 9:16 crop (escapes commas for ffmpeg 4.x)
-        parts.append(
-            "[0:v]"
-            "crop="
-            "iw*min(1.0\\,ih/iw*9/16):"
-            "ih*min(1.0\\,iw/ih*16/9):"
-            "(iw - iw*min(1.0\\,ih/iw*9/16))/2:"
-            "(ih - ih*min(1.0\\,iw/ih*16/9))/2[fg]"
-        )
+        parts.append(_CENTER_CROP)
 
-    # Fit FG to canvas, keep AR; composite over blurred BG
-    parts.append(f"[fg]scale={out_w}:{out_h}:force_original_aspect_ratio=decrease[fgs]")
-    parts.append("[bg][fgs]overlay=(W-w)/2:(H-h)/2[base]")
+    parts.append(composite)
 
     # Optional subtitles (burn before template)
     base_label = "[base]"
     if srt_path:
-        style_escaped = CAPTION_STYLE.replace(",", "\\,")
         srt_escaped = escape_for_subtitles(srt_path)
-        parts.append(f"{base_label}subtitles='{srt_escaped}':force_style='{style_escaped}'[base2]")
+        parts.append(
+            f"{base_label}subtitles='{srt_escaped}'"
+            f":force_style='{_STYLE_ESCAPED}'[base2]"
+        )
         base_label = "[base2]"
 
     # Template overlay on top (assumed full-canvas PNG with transparency)
@@ -204,6 +293,9 @@ def ff_design(
     srt_path: Optional[Path] = None,
 ):
     vf = build_filtergraph(crop_box=crop_box, out_w=out_w, out_h=out_h, srt_path=srt_path)
+    # Encode to a .part file and rename on success, so listings (and n8n triggers)
+    # never see a half-written *_vertical.mp4
+    tmp = dst.with_name(dst.name + ".part")
     cmd = [
         "ffmpeg", "-y",
         "-i", str(src),              # 0: video with audio
@@ -211,16 +303,43 @@ def ff_design(
         "-filter_complex", vf,
         "-map", "[outv]",
         "-map", "0:a?",
-        "-c:v", "libx264", "-preset", "veryfast", "-crf", "18",
+        *h264_encoder_args(crf=18),
+        "-threads", str(FFMPEG_THREADS),  # parallel renders share the cores
         "-c:a", "copy",
-        str(dst)
+        "-f", "mp4",                 # .part has no extension ffmpeg recognizes
+        str(tmp)
     ]
-    run(cmd)
+    try:
+        run(cmd)
+        os.replace(tmp, dst)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def design_one(clip_path: str, args_dict: dict) -> Path:
+    """Render one clip (pool worker); args_dict holds the render settings."""
+    clip = Path(clip_path)
+    srt_path = args_dict["srt_path"]
+
+    # Destination
+    dst_name = clip.stem.replace("_subtitled", "") + "_vertical.mp4"
+    dst = Path(args_dict["output_dir"]) / dst_name
+
+    # Render
+    ff_design(
+        src=clip,
+        dst=dst,
+        overlay_png=Path(args_dict["template"]),
+        crop_box=args_dict["crop_box"],
+        out_w=args_dict["width"],
+        out_h=args_dict["height"],
+        srt_path=Path(srt_path) if srt_path else None
+    )
+    return dst
 
 
 # ========= Main =========
-def main():
-    import argparse
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
     ap = argparse.ArgumentParser(
         description="Design vertical 9:16 video with template and (single) styled subtitle burn."
     )
@@ -245,11 +364,16 @@ def main():
                     help="Where .srt files live when subs_mode=off")
     ap.add_argument("--subs_file", default="", help="Single .srt to burn when subs_mode=file")
 
-    args = ap.parse_args()
+    return ap.parse_args(argv)
+
+
+def main(args: Optional[argparse.Namespace] = None):
+    if args is None:
+        args = parse_args()
 
     in_dir = Path(args.input_dir)
     out_dir = Path(args.output_dir)
-    out_dir.mkdir(parents=True, exist_ok=True)
+    ensure_dir(out_dir)
 
     template = Path(args.template)
     if not template.exists():
@@ -260,6 +384,9 @@ def main():
         print(f"[info] No clips found in {in_dir}")
         return
 
+    # Smart crop runs here, one clip at a time on the resident pyannote pipeline;
+    # the independent ffmpeg renders are then fanned out across a thread pool
+    jobs = []
     for clip in inputs:
         print(f"\n=== Designing {clip.name} ===")
 
@@ -274,6 +401,8 @@ def main():
             srt1 = clip.with_suffix(".srt")
             srt2 = Path(args.subs_dir) / (clip.stem + ".srt")
             srt = srt1 if srt1.exists() else (srt2 if srt2.exists() else None)
+            if srt is not None and srt.stat().st_size == 0:
+                srt = None  # no speech in the clip; ffmpeg can't open an empty SRT
 
         # Smart crop (pyannote) or fallback to center crop
         crop_box: Optional[Tuple[int, int, int, int]] = None
@@ -283,16 +412,12 @@ def main():
         else:
             try:
                 if args.pyannote_token:
-                    crops = resize(
-                        video_file_path=str(clip),
-                        pyannote_auth_token=args.pyannote_token,
-                        aspect_ratio=(9, 16)
-                    )
+                    crops = get_crops(clip, args.pyannote_token)
                     crop_box = pick_primary_crop(crops) or None
 
                     # NEW: Expand the crop box if detected
                     if crop_box and args.crop_expansion != 1.0:
-                        video_w, video_h = get_video_dimensions(clip)
+                        video_w, video_h = get_video_dimensions(clip, crops)
                         original_box = crop_box
                         crop_box = expand_crop_box(crop_box, video_w, video_h, args.crop_expansion)
                         print(f"[info] Expanded crop from {original_box} to {crop_box} (factor={args.crop_expansion})")
@@ -301,22 +426,23 @@ def main():
             except Exception as e:
                 print(f"[warn] resize() failed; using center crop. Details: {e}")
 
-        # Destination
-        dst = out_dir / (clip.stem.replace("_subtitled", "") + "_vertical.mp4")
-
-        # Render
-        ff_design(
-            src=clip,
-            dst=dst,
-            overlay_png=template,
-            crop_box=crop_box,
-            out_w=args.width,
-            out_h=args.height,
-            srt_path=srt
-        )
+        jobs.append({
+            "output_dir": str(out_dir),
+            "template": str(template),
+            "width": args.width,
+            "height": args.height,
+            "crop_box": crop_box,
+            "srt_path": str(srt) if srt else None,
+        })
+
+    # Probes NVENC once, before the render threads race to do it
+    workers = encode_workers(DESIGN_WORKERS)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(design_one, [str(clip) for clip in inputs], jobs))
 
     print("\n✅ All clips designed.")
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=os.environ.get("CLIPSAI_LOG_LEVEL", "INFO"))
     main()
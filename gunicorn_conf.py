@@ -0,0 +1,19 @@
+"""
+Gunicorn settings for the API (gunicorn -c gunicorn_conf.py app:app)
+"""
+
+import os
+
+bind = os.environ.get("CLIPSAI_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("CLIPSAI_WEB_WORKERS", 4))
+
+# Quart is ASGI: each worker runs an event loop, so concurrency comes from
+# awaiting I/O rather than from threads. The worker ships in the uvicorn-worker
+# package (requirements.txt); uvicorn.workers is deprecated
+worker_class = "uvicorn_worker.UvicornWorker"
+
+# Import the app once in the master; workers are forked from it and share the
+# loaded modules copy-on-write instead of importing them four times
+preload_app = True
+
+timeout = 600
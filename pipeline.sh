@@ -62,7 +62,7 @@ printf '%s\n' "$URL" | python3 "$PROJECT_DIR/quicktest.py"
 
 # ========= 2) Generate SRTs (no burning) =========
 echo "==> Step 2/3: Transcribe to SRT"
-python3 "$PROJECT_DIR/subtitles.py"
+python3 "$PROJECT_DIR/subtitles.py" --no_burn
 
 # ========= 3) Final design + single subtitle burn =========
 echo "==> Step 3/3: Design vertical clips & burn captions once"
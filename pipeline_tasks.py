@@ -0,0 +1,250 @@
+"""
+Pipeline jobs executed by RQ workers
+
+Run a worker next to the API with:
+    python3 worker.py
+"""
+
+import logging
+from typing import Dict, Tuple
+
+from rq import get_current_job
+
+from pipeline_utils import (
+    CLIPS_DIR,
+    DESIGNED_DIR,
+    PYANNOTE_TOKEN,
+    SUBTITLED_DIR,
+    VIDEOS_DIR,
+    ensure_media_dirs,
+    get_file_info,
+    list_directory_files,
+    remove_files,
+)
+from quicktest import get_clipfinder, get_transcriber, run_pipeline
+from subtitles import run as run_subtitles, warm_model as warm_subtitle_model
+from design import get_diarizer, main as design_main, parse_args as design_parse_args
+
+logger = logging.getLogger(__name__)
+
+# Ensure directories exist
+ensure_media_dirs()
+
+
+def warm_models() -> None:
+    """Load every model the jobs use, so workers start with them resident"""
+    get_transcriber()
+    get_clipfinder()
+    warm_subtitle_model()
+    if PYANNOTE_TOKEN:
+        get_diarizer(PYANNOTE_TOKEN)
+
+
+def report_progress(step: str, message: str) -> None:
+    """Publish progress on the current RQ job (no-op outside a worker)"""
+    logger.info(message)
+    job = get_current_job()
+    if job is None:
+        return
+    job.meta["progress"] = {"step": step, "message": message}
+    job.save_meta()
+
+
+class PipelineStepError(RuntimeError):
+    """A pipeline step failed; `body` is the error response for the client"""
+
+    def __init__(self, body: Dict) -> None:
+        super().__init__(f"{body['error']}: {body.get('details', '')}")
+        self.body = body
+
+
+def finish_job(body: Dict, code: int) -> Dict:
+    """Return a step's body as the job result, or fail the job with it"""
+    if code != 200:
+        job = get_current_job()
+        if job is not None:
+            job.meta["error"] = body
+            job.save_meta()
+        raise PipelineStepError(body)
+    return body
+
+
+# ========= Step implementations (plain arguments, no request context) =========
+def _process_video_impl(video_url: str, video_id: str = "default") -> Tuple[Dict, int]:
+    """Step 1: Download YouTube video and create clips using quicktest.py"""
+    report_progress("process_video", f"Processing video: {video_url}")
+
+    # Clean up previous clips
+    remove_files(CLIPS_DIR, "clip_", ".mp4")
+
+    try:
+        run_pipeline(video_url)
+    except Exception as e:
+        return {"error": "Video processing failed", "details": str(e)}, 500
+
+    # Get generated clips
+    clips = list_directory_files(CLIPS_DIR, "clip_*.mp4")
+
+    # Get downloaded video info
+    downloaded_video = list(VIDEOS_DIR.glob("input.*"))
+    video_info = get_file_info(downloaded_video[0]) if downloaded_video else None
+
+    return {
+        "status": "success",
+        "video_id": video_id,
+        "source_video": video_info,
+        "clips_count": len(clips),
+        "clips": clips,
+        "message": f"Generated {len(clips)} clips from video"
+    }, 200
+
+
+def _add_subtitles_impl(
+    video_id: str = "default", burn: bool = True
+) -> Tuple[Dict, int]:
+    """Step 2: Generate (and optionally burn) subtitles using subtitles.py"""
+    report_progress("add_subtitles", "Adding subtitles to clips...")
+
+    # Clean up previous subtitled clips
+    remove_files(SUBTITLED_DIR, suffix=(".mp4", ".srt"))
+
+    try:
+        run_subtitles(burn=burn)
+    except Exception as e:
+        return {"error": "Subtitle generation failed", "details": str(e)}, 500
+
+    # Get subtitled clips
+    subtitled_clips = list_directory_files(SUBTITLED_DIR, "clip_*_subtitled.mp4")
+    srt_files = list_directory_files(SUBTITLED_DIR, "*.srt")
+    subtitled_count = len(subtitled_clips) if burn else len(srt_files)
+
+    return {
+        "status": "success",
+        "video_id": video_id,
+        "subtitled_clips_count": len(subtitled_clips),
+        "subtitled_clips": subtitled_clips,
+        "srt_files_count": len(srt_files),
+        "srt_files": srt_files,
+        "message": f"Added subtitles to {subtitled_count} clips"
+    }, 200
+
+
+def _apply_design_impl(params: Dict) -> Tuple[Dict, int]:
+    """
+    Step 3: Apply 9:16 vertical design with template using design.py
+
+    params: video_id, crop_expansion, disable_smart_crop, use_subtitles
+    """
+    video_id = params.get('video_id', 'default')
+    try:
+        crop_expansion = float(params.get('crop_expansion', 3.0))
+    except (TypeError, ValueError) as e:
+        # design.py's argparse would exit the worker's job with a bare SystemExit
+        return {"error": "Invalid 'crop_expansion'", "details": str(e)}, 400
+    disable_smart_crop = params.get('disable_smart_crop', False)
+    use_subtitles = params.get('use_subtitles', True)
+
+    report_progress("apply_design", "Applying vertical design to clips...")
+
+    # Clean up previous designed clips
+    remove_files(DESIGNED_DIR, suffix=".mp4")
+
+    # Build command arguments
+    args = [
+        "--input_dir", str(CLIPS_DIR),
+        "--output_dir", str(DESIGNED_DIR),
+        "--crop_expansion", str(crop_expansion),
+        "--pyannote_token", PYANNOTE_TOKEN
+    ]
+
+    if disable_smart_crop:
+        args.append("--disable_smart_crop")
+
+    if use_subtitles:
+        args.extend(["--subs_mode", "auto"])
+        args.extend(["--subs_dir", str(SUBTITLED_DIR)])
+    else:
+        args.extend(["--subs_mode", "off"])
+
+    try:
+        design_main(design_parse_args(args))
+    except Exception as e:
+        return {"error": "Design application failed", "details": str(e)}, 500
+
+    # Get designed clips
+    designed_clips = list_directory_files(DESIGNED_DIR, "*_vertical.mp4")
+
+    return {
+        "status": "success",
+        "video_id": video_id,
+        "designed_clips_count": len(designed_clips),
+        "designed_clips": designed_clips,
+        "settings": {
+            "crop_expansion": crop_expansion,
+            "smart_crop_enabled": not disable_smart_crop,
+            "subtitles_enabled": use_subtitles
+        },
+        "message": f"Applied design to {len(designed_clips)} clips"
+    }, 200
+
+
+def _process_complete_pipeline_impl(params: Dict) -> Tuple[Dict, int]:
+    """
+    All-in-one: Download → Clip → Subtitle → Design
+
+    params: url plus the _apply_design_impl params
+    """
+    video_id = params.get('video_id')
+    results = {}
+
+    report_progress("pipeline", "Step 1/3: Processing video and creating clips...")
+    body, code = _process_video_impl(params['url'], video_id or "default")
+    results['step1_clips'] = body
+    if code != 200:
+        return body, code
+
+    # design.py burns the SRTs while rendering, so skip the separate burn encode
+    report_progress("pipeline", "Step 2/3: Adding subtitles...")
+    body, code = _add_subtitles_impl(video_id or "default", burn=False)
+    results['step2_subtitles'] = body
+    if code != 200:
+        return body, code
+
+    report_progress("pipeline", "Step 3/3: Applying vertical design...")
+    body, code = _apply_design_impl({
+        "video_id": video_id,
+        "crop_expansion": params.get('crop_expansion', 3.0),
+        "disable_smart_crop": params.get('disable_smart_crop', False),
+        "use_subtitles": params.get('use_subtitles', True)
+    })
+    results['step3_design'] = body
+    if code != 200:
+        return body, code
+
+    return {
+        "status": "success",
+        "message": "Complete pipeline executed successfully",
+        "summary": {
+            "clips_generated": results['step1_clips']['clips_count'],
+            "subtitles_added": results['step2_subtitles']['srt_files_count'],
+            "designs_created": results['step3_design']['designed_clips_count']
+        },
+        "details": results
+    }, 200
+
+
+# ========= RQ jobs =========
+def process_video(video_url: str, video_id: str = "default") -> Dict:
+    return finish_job(*_process_video_impl(video_url, video_id))
+
+
+def add_subtitles(video_id: str = "default", burn: bool = True) -> Dict:
+    return finish_job(*_add_subtitles_impl(video_id, burn))
+
+
+def apply_design(params: Dict) -> Dict:
+    return finish_job(*_apply_design_impl(params))
+
+
+def process_complete_pipeline(params: Dict) -> Dict:
+    return finish_job(*_process_complete_pipeline_impl(params))
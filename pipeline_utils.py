@@ -0,0 +1,194 @@
+"""
+Shared configuration and file helpers for the API and pipeline workers
+"""
+
+import fnmatch
+import os
+import subprocess
+import time
+from collections import deque
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Set, Tuple, Union
+
+# ========= Configuration =========
+PROJECT_DIR = Path("/home/michael_adegoke/clipsai")
+BASE_DIR = Path("/home/michael_adegoke")
+VIDEOS_DIR = BASE_DIR / "videos"
+CLIPS_DIR = BASE_DIR / "clips"
+SUBTITLED_DIR = BASE_DIR / "subtitled"
+DESIGNED_DIR = BASE_DIR / "designed"
+
+# Environment variables
+PYANNOTE_TOKEN = os.environ.get("PYANNOTE_AUTH_TOKEN", "")
+COOKIES_PATH = os.environ.get("CLIPSAI_COOKIES", str(BASE_DIR / "cookies.txt"))
+REDIS_URL = os.environ.get("CLIPSAI_REDIS_URL", "redis://localhost:6379/0")
+HW_ENCODER = os.environ.get("CLIPSAI_HW_ENCODER", "auto")  # auto|off
+# Concurrent h264_nvenc encodes; consumer NVIDIA GPUs refuse sessions past ~3-8
+NVENC_SESSIONS = int(os.environ.get("CLIPSAI_NVENC_SESSIONS", "3"))
+# Internal nginx location prefix for /download-file (X-Accel-Redirect);
+# empty = serve directly
+ACCEL_REDIRECT_PREFIX = os.environ.get("CLIPSAI_ACCEL_REDIRECT_PREFIX", "").rstrip("/")
+
+
+# Directories this process has already created
+_created_dirs: Set[Path] = set()
+
+# (directory, pattern) -> (directory mtime_ns, cached at, listing)
+_listing_cache: Dict[Tuple[Path, str], Tuple[int, float, List[Dict]]] = {}
+# Upper bound on staleness: in-place writes grow files without touching the
+# directory mtime, so listings are also refreshed after this many seconds
+LISTING_CACHE_TTL = 30.0
+
+
+# ========= Helper Functions =========
+class CommandError(subprocess.CalledProcessError):
+    """A failed subprocess; str() includes the tail of its output"""
+
+    def __str__(self) -> str:
+        return f"{super().__str__()}\n{self.output}"
+
+
+def run_command(cmd: List[str], tail_lines: int = 500) -> None:
+    """
+    Run a subprocess, streaming its merged stdout/stderr line by line and keeping
+    only the last `tail_lines` lines, so memory stays bounded however verbose the
+    child is (ffmpeg). Raises CommandError with that tail on failure.
+    """
+    tail = deque(maxlen=tail_lines)
+    with subprocess.Popen(
+        cmd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        errors="replace"
+    ) as proc:
+        for line in proc.stdout:
+            tail.append(line)
+    if proc.returncode != 0:
+        raise CommandError(proc.returncode, cmd, output="".join(tail))
+
+
+def ensure_dir(dir_path: Path) -> Path:
+    """mkdir -p, skipped for directories already created by this process"""
+    if dir_path not in _created_dirs:
+        dir_path.mkdir(parents=True, exist_ok=True)
+        _created_dirs.add(dir_path)
+    return dir_path
+
+
+@lru_cache(maxsize=None)
+def nvenc_available() -> bool:
+    """
+    Whether ffmpeg can encode with h264_nvenc on this host (probed once).
+    A tiny test encode is used because builds list nvenc even without a GPU.
+    """
+    if HW_ENCODER == "off":
+        return False
+    cmd = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error",
+        "-f", "lavfi", "-i", "color=s=256x256:d=0.1",
+        "-frames:v", "1", "-c:v", "h264_nvenc", "-f", "null", "-"
+    ]
+    try:
+        subprocess.run(cmd, capture_output=True, check=True, timeout=30)
+    except (OSError, subprocess.SubprocessError):
+        return False
+    return True
+
+
+def h264_encoder_args(crf: int = 18) -> List[str]:
+    """Video codec args: NVENC when available, otherwise libx264 at `crf`"""
+    if nvenc_available():
+        return [
+            "-c:v", "h264_nvenc", "-preset", "p4",
+            "-rc", "vbr", "-cq", str(crf + 2), "-b:v", "0"
+        ]
+    return ["-c:v", "libx264", "-preset", "veryfast", "-crf", str(crf)]
+
+
+def encode_workers(workers: int) -> int:
+    """Parallel encodes to run: `workers`, capped to NVENC_SESSIONS on NVENC"""
+    if nvenc_available():
+        return max(1, min(workers, NVENC_SESSIONS))
+    return workers
+
+
+def cached_list_directory_files(directory: Path, pattern: str = "*") -> List[Dict]:
+    """list_directory_files, served from memory while the directory is unchanged"""
+    key = (directory, pattern)
+    mtime = directory.stat().st_mtime_ns
+    now = time.monotonic()
+    hit = _listing_cache.get(key)
+    if hit and hit[0] == mtime and now - hit[1] < LISTING_CACHE_TTL:
+        return hit[2]
+    files = list_directory_files(directory, pattern)
+    _listing_cache[key] = (mtime, now, files)
+    return files
+
+
+def invalidate_listing_cache(directory: Path = None) -> None:
+    """Drop cached listings for one directory (default: all)"""
+    if directory is None:
+        _listing_cache.clear()
+        return
+    for key in [k for k in _listing_cache if k[0] == directory]:
+        del _listing_cache[key]
+
+
+def remove_files(
+    directory: Path, prefix: str = "", suffix: Union[str, Tuple[str, ...]] = ""
+) -> int:
+    """Unlink the (non-hidden) files matching prefix/suffix; returns the count"""
+    removed = 0
+    with os.scandir(directory) as it:
+        for e in it:
+            if (
+                not e.name.startswith(".")
+                and e.name.startswith(prefix)
+                and e.name.endswith(suffix)
+                and e.is_file()
+            ):
+                os.unlink(e.path)
+                removed += 1
+    return removed
+
+
+def ensure_media_dirs() -> None:
+    """Ensure the pipeline directories exist"""
+    for dir_path in [VIDEOS_DIR, CLIPS_DIR, SUBTITLED_DIR, DESIGNED_DIR]:
+        ensure_dir(dir_path)
+
+
+def get_file_info(file_path: Path) -> Dict:
+    """Get file metadata"""
+    try:
+        st = file_path.stat()
+    except FileNotFoundError:
+        return None
+    return _file_info(file_path.name, str(file_path), st)
+
+
+def _file_info(name: str, path: str, st: os.stat_result) -> Dict:
+    return {
+        "filename": name,
+        "path": path,
+        "size_mb": round(st.st_size / (1024 * 1024), 2),
+        "modified": datetime.fromtimestamp(st.st_mtime).isoformat()
+    }
+
+
+def list_directory_files(directory: Path, pattern: str = "*") -> List[Dict]:
+    """List files in directory with metadata (one scandir pass, one stat per file)"""
+    match_all = pattern == "*"
+    with os.scandir(directory) as it:
+        entries = [
+            e for e in it
+            if not e.name.startswith(".")  # hidden files, as glob() skips them
+            and (match_all or fnmatch.fnmatch(e.name, pattern))
+            and e.is_file()
+        ]
+    entries.sort(key=lambda e: e.name)
+    return [_file_info(e.name, e.path, e.stat()) for e in entries]
@@ -2,7 +2,10 @@
 import os
 import subprocess
 from pathlib import Path
+from typing import List
+
 from clipsai import ClipFinder, Transcriber
+from pipeline_utils import CommandError, ensure_dir, remove_files, run_command
 
 # ========= Paths (portable) =========
 PROJECT_DIR = Path(__file__).resolve().parent                 # /home/.../clipsai
@@ -10,60 +13,120 @@ MEDIA_DIR   = Path(os.getenv("CLIPSAI_MEDIA_DIR", PROJECT_DIR.parent))  # defaul
 VIDEOS_DIR  = MEDIA_DIR / "videos"
 CLIPS_DIR   = MEDIA_DIR / "clips"
 
-VIDEOS_DIR.mkdir(parents=True, exist_ok=True)
-CLIPS_DIR.mkdir(parents=True, exist_ok=True)
+ensure_dir(VIDEOS_DIR)
+ensure_dir(CLIPS_DIR)
 
 # Optional cookies (e.g., for age/region gating)
 COOKIES_PATH = os.getenv("CLIPSAI_COOKIES", str(MEDIA_DIR / "cookies.txt"))
 
-# ========= Input =========
-video_url = input("Enter YouTube URL: ").strip()
-if not video_url:
-    raise SystemExit("No URL provided.")
-
-# ========= Step 1: Download source video =========
-print(" Downloading video...")
-output_template = str(VIDEOS_DIR / "input.%(ext)s")
-
-yt_cmd = ["yt-dlp", "-o", output_template, video_url]
-if Path(COOKIES_PATH).exists():
-    yt_cmd[1:1] = ["--cookies", COOKIES_PATH]  # insert after binary
-
-subprocess.run(yt_cmd, check=True)
-
-downloaded_files = sorted(VIDEOS_DIR.glob("input.*"))
-if not downloaded_files:
-    raise FileNotFoundError(" No video was downloaded!")
-input_video = str(downloaded_files[0])
-print(f" Video downloaded to: {input_video}")
-
-# ========= Step 2: Transcribe =========
-print(" Transcribing...")
-transcriber = Transcriber()  # uses clipsai defaults
-transcription = transcriber.transcribe(audio_file_path=input_video)
-
-# ========= Step 3: Find clips =========
-print(" Finding interesting clips...")
-clipfinder = ClipFinder()
-clips = clipfinder.find_clips(transcription=transcription)
-if not clips:
-    raise SystemExit("No clips were found.")
-
-# ========= Step 4: Save clips (stream copy) =========
-for idx, clip in enumerate(clips, start=1):
-    start = clip.start_time
-    end = clip.end_time
-    duration = end - start
-    output_file = CLIPS_DIR / f"clip_{idx}.mp4"
-
-    print(f" Saving clip {idx}: {start:.2f} → {end:.2f} as {output_file}")
-    subprocess.run([
-        "ffmpeg", "-y",
-        "-i", input_video,
-        "-ss", str(start),
-        "-t", str(duration),
+# ========= Models (loaded once, kept resident between runs) =========
+_transcriber = None
+_clipfinder = None
+
+
+def get_transcriber() -> Transcriber:
+    """Return the shared Transcriber, loading the whisperx model on first use."""
+    global _transcriber
+    if _transcriber is None:
+        _transcriber = Transcriber()  # uses clipsai defaults
+    return _transcriber
+
+
+def get_clipfinder() -> ClipFinder:
+    """Return the shared ClipFinder, loading the text embedder on first use."""
+    global _clipfinder
+    if _clipfinder is None:
+        _clipfinder = ClipFinder()
+    return _clipfinder
+
+
+def run_pipeline(video_url: str) -> List[Path]:
+    """Download `video_url`, find clips and save them; returns the clip paths."""
+    # ========= Step 1: Download source video =========
+    # yt-dlp merges the best video+audio into a streamable Matroska on stdout and
+    # ffmpeg remuxes it to a seekable mp4 as it arrives, so the download never lands
+    # on disk in its original container. Without an explicit selector, `-o -` falls
+    # back to the single pre-merged format (often 360p on YouTube). H.264/AAC are
+    # preferred so the mp4 remux is a plain stream copy
+    print(" Downloading video...")
+    remove_files(VIDEOS_DIR, prefix="input.")  # stale downloads in other containers
+    input_video = str(VIDEOS_DIR / "input.mp4")
+
+    yt_cmd = [
+        "yt-dlp",
+        "-f", "bv*+ba/b",
+        "-S", "vcodec:h264,acodec:aac",
+        "--merge-output-format", "mkv",
+        "-o", "-",
+        video_url
+    ]
+    if Path(COOKIES_PATH).exists():
+        yt_cmd[1:1] = ["--cookies", COOKIES_PATH]  # insert after binary
+    ff_cmd = [
+        "ffmpeg", "-y", "-loglevel", "error",
+        "-i", "pipe:0",
         "-c", "copy",
-        str(output_file)
-    ], check=True)
+        "-movflags", "+faststart",
+        input_video
+    ]
+
+    yt_proc = subprocess.Popen(yt_cmd, stdout=subprocess.PIPE)
+    try:
+        ff_proc = subprocess.Popen(
+            ff_cmd, stdin=yt_proc.stdout, stderr=subprocess.PIPE,
+            text=True, errors="replace"
+        )
+    finally:
+        yt_proc.stdout.close()  # ffmpeg holds the read end; lets yt-dlp see SIGPIPE
+    _, ff_err = ff_proc.communicate()
+    yt_code = yt_proc.wait()
+    # ffmpeg first: if it dies, yt-dlp only reports the broken pipe it caused
+    if ff_proc.returncode != 0:
+        raise CommandError(ff_proc.returncode, ff_cmd, output=ff_err)
+    if yt_code != 0:
+        raise subprocess.CalledProcessError(yt_code, yt_cmd)
+
+    if not Path(input_video).exists():
+        raise FileNotFoundError(" No video was downloaded!")
+    print(f" Video downloaded to: {input_video}")
+
+    # ========= Step 2: Transcribe =========
+    print(" Transcribing...")
+    transcription = get_transcriber().transcribe(audio_file_path=input_video)
+
+    # ========= Step 3: Find clips =========
+    print(" Finding interesting clips...")
+    clips = get_clipfinder().find_clips(transcription=transcription)
+    if not clips:
+        raise RuntimeError("No clips were found.")
+
+    # ========= Step 4: Save clips (stream copy) =========
+    # One ffmpeg run opens the source once and writes every clip as its own output
+    ffmpeg_cmd = ["ffmpeg", "-y", "-i", input_video]
+    clip_paths = []
+    for idx, clip in enumerate(clips, start=1):
+        start = clip.start_time
+        end = clip.end_time
+        output_file = CLIPS_DIR / f"clip_{idx}.mp4"
+
+        print(f" Saving clip {idx}: {start:.2f} → {end:.2f} as {output_file}")
+        ffmpeg_cmd += [
+            "-ss", str(start),
+            "-to", str(end),
+            "-c", "copy",
+            str(output_file)
+        ]
+        clip_paths.append(output_file)
+
+    run_command(ffmpeg_cmd)
+
+    print("All clips saved in:", CLIPS_DIR)
+    return clip_paths
+
 
-print("All clips saved in:", CLIPS_DIR)
+if __name__ == "__main__":
+    # ========= Input =========
+    video_url = input("Enter YouTube URL: ").strip()
+    if not video_url:
+        raise SystemExit("No URL provided.")
+    run_pipeline(video_url)
@@ -1,55 +1,327 @@
+import argparse
 import os
-import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-import whisper
+from typing import List, Tuple
+
+import ctranslate2
+from faster_whisper import BatchedInferencePipeline, WhisperModel
+from faster_whisper.audio import decode_audio
+from faster_whisper.vad import VadOptions, get_speech_timestamps, merge_segments
+
+from pipeline_utils import (
+    encode_workers, ensure_dir, h264_encoder_args, nvenc_available, run_command
+)
 
 # -------- CONFIG --------
 base_dir = Path("/home/michael_adegoke")
 clips_dir = base_dir / "clips"
 subs_dir = base_dir / "subtitled"
-subs_dir.mkdir(parents=True, exist_ok=True)
+ensure_dir(subs_dir)
 
-# Load Whisper (tiny/medium/large available)
-print("📝 Loading Whisper model...")
-model = whisper.load_model("small")
+# Model size name or path to a pre-converted CTranslate2 model, e.g. one built with
+#   ct2-transformers-converter --model openai/whisper-small \
+#       --quantization int8_float16 --output_dir whisper-small-ct2
+WHISPER_MODEL = os.environ.get("CLIPSAI_WHISPER_MODEL", "small")
+# VAD chunks decoded per forward pass; lower it on small GPUs / low-RAM hosts
+BATCH_SIZE = int(os.environ.get("CLIPSAI_WHISPER_BATCH_SIZE", "16"))
+# Optional whisper.cpp backend for CPU-only hosts: path to its `main` binary and a
+# ggml model (e.g. ggml-small-q8_0.bin); both must be set to use it
+WHISPER_CPP = os.environ.get("CLIPSAI_WHISPER_CPP", "")
+WHISPER_CPP_MODEL = os.environ.get("CLIPSAI_WHISPER_CPP_MODEL", "")
+# Hard-burn captions into the pixels (a full re-encode) instead of muxing the SRT
+# as a soft mov_text track with the video stream-copied
+BURN_IN = os.environ.get("CLIPSAI_BURN_IN", "0") == "1"
+# Clips processed concurrently. Threads rather than processes: CTranslate2 and
+# ffmpeg release the GIL, and every thread goes through the one WhisperModel
+FFMPEG_THREADS = 2
+SUBTITLE_WORKERS = int(os.environ.get(
+    "CLIPSAI_SUBTITLE_WORKERS", max(1, (os.cpu_count() or 2) // FFMPEG_THREADS)
+))
+# Cores each concurrent transcription may use, so the workers together don't
+# oversubscribe the host
+CPU_THREADS = max(1, (os.cpu_count() or 2) // SUBTITLE_WORKERS)
 
-# -------- Process all clips --------
-for clip_file in clips_dir.glob("clip_*.mp4"):
-    print(f"🎬 Processing {clip_file.name}...")
+# Silero VAD settings BatchedInferencePipeline uses by default (30 s = Whisper window)
+_VAD_OPTIONS = VadOptions(max_speech_duration_s=30, min_silence_duration_ms=160)
+
+# One model per process, built once and reused by every clip and thread: its
+# CTranslate2 replicas keep their allocator cache (decoder KV buffers included)
+# warm across transcribe() calls. The lock stops racing threads double-loading it
+_model = None
+_pipeline = None
+_model_lock = threading.RLock()
+
+
+def get_model() -> WhisperModel:
+    """Return the shared Whisper model, loading it on first use."""
+    global _model
+    with _model_lock:
+        if _model is not None:
+            return _model
+        # CTranslate2 build of Whisper (WHISPER_MODEL: a size name or a model path):
+        # fp16 on tensor cores when a CUDA device is present, int8 GEMMs on CPU
+        # num_workers lets that many threads run transcribe() in parallel; CTranslate2
+        # runs one model replica per worker, so on CUDA (where every replica and its
+        # BATCH_SIZE batches take VRAM) there is one, and the batch fills the GPU.
+        # On CPU, cpu_threads caps each worker's share of the cores (default 4)
+        if ctranslate2.get_cuda_device_count() > 0:
+            device, compute_type, workers = "cuda", "float16", 1
+        else:
+            device, compute_type, workers = "cpu", "int8", SUBTITLE_WORKERS
+        print(f"📝 Loading Whisper model ({device}, {compute_type})...")
+        _model = WhisperModel(
+            WHISPER_MODEL, device=device, compute_type=compute_type,
+            num_workers=workers, cpu_threads=CPU_THREADS
+        )
+        return _model
+
+
+def get_pipeline() -> BatchedInferencePipeline:
+    """Return the batched pipeline wrapping the shared model."""
+    global _pipeline
+    with _model_lock:
+        if _pipeline is None:
+            _pipeline = BatchedInferencePipeline(model=get_model())
+        return _pipeline
+
+
+def warm_model() -> None:
+    """Load the transcription model now (whisper.cpp loads its own per call)."""
+    if not (WHISPER_CPP and WHISPER_CPP_MODEL):
+        get_pipeline()
+
+
+def _fmt(t: float) -> str:
+    """SRT timestamp (HH:MM:SS,mmm) for t seconds, in integer milliseconds."""
+    h, r = divmod(int(t * 1000), 3_600_000)
+    m, r = divmod(r, 60_000)
+    s, ms = divmod(r, 1000)
+    return f"{h:02}:{m:02}:{s:02},{ms:03}"
+
+
+def transcribe_to_srt(clip_file: Path, srt_path: Path) -> None:
+    """Transcribe clip_file and write its subtitles to srt_path."""
+    if WHISPER_CPP and WHISPER_CPP_MODEL:
+        _whisper_cpp_srt(clip_file, srt_path)
+        return
+
+    # Step 1: Decode the audio stream once, in-process (PyAV, no ffmpeg spawn; video
+    # packets are skipped), to the 16 kHz mono float32 array Whisper consumes
+    audio = decode_audio(str(clip_file))
+
+    # Step 2: Silero VAD splits the clip into speech chunks, so silence never
+    # reaches the decoder; clips with no speech at all skip the model entirely
+    speech = merge_segments(get_speech_timestamps(audio, _VAD_OPTIONS), _VAD_OPTIONS)
+    if not speech:
+        srt_path.write_bytes(b"")
+        return
+
+    # Step 3: Transcribe the speech chunks, BATCH_SIZE per forward pass. The batched
+    # pipeline makes a single pass at the first temperature (0.0) without
+    # conditioning on earlier text, so the beam is the one decode cost left to
+    # cut: greedy instead of the default 5 beams
+    segments, _ = get_pipeline().transcribe(
+        audio,
+        beam_size=1,
+        # The batched pipeline samples text tokens only by default, which yields one
+        # segment (cue) per VAD chunk of up to 30 s; timestamp tokens split it into
+        # sentence-length cues like openai-whisper's
+        without_timestamps=False,
+        clip_timestamps=speech,
+        batch_size=BATCH_SIZE
+    )
+
+    # Step 4: Save subtitles in SRT format (fields pulled out in one pass each)
+    segments = list(segments)
+    starts = [_fmt(seg.start) for seg in segments]
+    ends = [_fmt(seg.end) for seg in segments]
+    texts = [seg.text.strip() for seg in segments]
+    body = "".join([
+        f"{i}\n{a} --> {b}\n{t}\n\n"
+        for i, (a, b, t) in enumerate(zip(starts, ends, texts), start=1)
+    ])
+    srt_path.write_bytes(body.encode("utf-8"))  # one encode pass, one write
 
-    # Step 1: Transcribe
-    result = model.transcribe(str(clip_file), verbose=False)
-    srt_path = subs_dir / (clip_file.stem + ".srt")
 
-    # Step 2: Save subtitles in SRT format
-    with open(srt_path, "w", encoding="utf-8") as f:
-        for i, segment in enumerate(result["segments"], start=1):
-            start = segment["start"]
-            end = segment["end"]
-            text = segment["text"].strip()
+def _whisper_cpp_srt(clip_file: Path, srt_path: Path) -> None:
+    """Transcribe with whisper.cpp, which writes the SRT itself (-osrt)."""
+    with tempfile.TemporaryDirectory() as tmp:
+        # whisper.cpp reads 16 kHz mono WAV only
+        wav_path = Path(tmp) / "audio.wav"
+        run_command([
+            "ffmpeg", "-y", "-nostdin", "-loglevel", "error",
+            "-i", str(clip_file),
+            "-vn", "-ac", "1", "-ar", "16000", "-c:a", "pcm_s16le",
+            str(wav_path)
+        ])
+        run_command([
+            WHISPER_CPP,
+            "-m", WHISPER_CPP_MODEL,
+            "-f", str(wav_path),
+            "-t", str(CPU_THREADS),
+            "-osrt", "-of", str(srt_path.with_suffix("")),
+            "-np"
+        ])
 
-            # Convert to SRT timestamp format
-            def format_time(t):
-                hrs = int(t // 3600)
-                mins = int((t % 3600) // 60)
-                secs = int(t % 60)
-                ms = int((t * 1000) % 1000)
-                return f"{hrs:02}:{mins:02}:{secs:02},{ms:03}"
 
-            f.write(f"{i}\n{format_time(start)} --> {format_time(end)}\n{text}\n\n")
+def _is_fresh(output: Path, *inputs: Path) -> bool:
+    """Whether output exists and is at least as new as every input."""
+    try:
+        mtime = output.stat().st_mtime
+    except FileNotFoundError:
+        return False
+    return all(mtime >= p.stat().st_mtime for p in inputs)
 
+
+def write_clip_srt(clip_file: Path) -> Path:
+    """Transcribe one clip into subs_dir (unless already done); returns the SRT path."""
+    srt_path = subs_dir / (clip_file.stem + ".srt")
+    if _is_fresh(srt_path, clip_file):
+        print(f"⏭️  {srt_path.name} is up to date")
+        return srt_path
+
+    print(f"🎬 Processing {clip_file.name}...")
+    transcribe_to_srt(clip_file, srt_path)
     print(f"✅ Subtitles saved to {srt_path}")
+    return srt_path
+
+
+def mux_subtitles(pairs: List[Tuple[Path, Path]]) -> List[Path]:
+    """
+    Mux each (clip, SRT) pair's SRT into its clip as a soft mov_text track;
+    returns the subtitled video paths.
+
+    Stream copy only (I/O bound), so every stale pair goes through a single
+    ffmpeg run with one output per clip instead of an ffmpeg spawn per clip.
+    """
+    inputs: List[str] = []
+    outputs: List[str] = []
+    pending: List[Tuple[Path, Path]] = []  # (.part, final) for this run
+    results = []
+    for clip_file, srt_path in pairs:
+        output_file = subs_dir / (clip_file.stem + "_subtitled.mp4")
+        results.append(output_file)
+        if _is_fresh(output_file, clip_file, srt_path):
+            print(f"⏭️  {output_file.name} is up to date")
+            continue
+
+        video = len(inputs) // 2
+        inputs += ["-i", str(clip_file)]
+        maps = ["-map", f"{video}:v", "-map", f"{video}:a?", "-c", "copy"]
+        # No speech: nothing to add, and ffmpeg can't open an empty SRT
+        if srt_path.stat().st_size:
+            inputs += ["-i", str(srt_path)]
+            maps += [
+                "-map", f"{video + 1}:0",
+                "-c:s", "mov_text",
+                "-metadata:s:s:0", "language=eng",
+            ]
+        # Written under a temporary name, so an interrupted run never leaves a
+        # partial file that looks up to date to the next one
+        tmp = output_file.with_name(output_file.name + ".part")
+        outputs += maps + ["-f", "mp4", str(tmp)]
+        pending.append((tmp, output_file))
+
+    if not pending:
+        return results
+    try:
+        run_command([
+            "ffmpeg", "-y", "-nostdin", "-loglevel", "error", *inputs, *outputs
+        ])
+        for tmp, output_file in pending:
+            os.replace(tmp, output_file)
+            print(f"✅ Subtitled video saved to {output_file}")
+    finally:
+        for tmp, _ in pending:
+            tmp.unlink(missing_ok=True)
+    return results
 
-    # Step 3: Burn subtitles into video
+
+def burn_subtitles(clip_file: Path, srt_path: Path) -> Path:
+    """Burn srt_path into clip_file's frames (unless up to date); returns the video."""
     output_file = subs_dir / (clip_file.stem + "_subtitled.mp4")
-    subprocess.run([
-        "ffmpeg",
-        "-i", str(clip_file),
-        "-vf", f"subtitles={srt_path}",
-        "-c:a", "copy",
-        str(output_file)
-    ], check=True)
+    if _is_fresh(output_file, clip_file, srt_path):
+        print(f"⏭️  {output_file.name} is up to date")
+        return output_file
+
+    cmd = ["ffmpeg", "-y", "-nostdin", "-loglevel", "error"]
+    if srt_path.stat().st_size == 0:
+        # No speech: nothing to add, and ffmpeg can't open an empty SRT
+        cmd += ["-i", str(clip_file), "-c", "copy"]
+    else:
+        # With NVENC, decode on the GPU too; frames come back to system memory for
+        # the (CPU-only) subtitles filter and go out again to the hardware encoder
+        if nvenc_available():
+            cmd += ["-hwaccel", "cuda"]
+        cmd += [
+            "-i", str(clip_file),
+            "-vf", f"subtitles={srt_path}",
+            *h264_encoder_args(crf=23),      # libx264 fallback: veryfast, crf 23
+            "-pix_fmt", "yuv420p",           # playable everywhere
+            "-threads", str(FFMPEG_THREADS),  # parallel clips share the cores
+            "-c:a", "copy",
+            "-movflags", "+faststart",
+        ]
+
+    tmp = output_file.with_name(output_file.name + ".part")
+    try:
+        run_command(cmd + ["-f", "mp4", str(tmp)])
+        os.replace(tmp, output_file)
+    finally:
+        tmp.unlink(missing_ok=True)
 
     print(f"✅ Subtitled video saved to {output_file}")
+    return output_file
+
+
+def run(burn: bool = True) -> List[Path]:
+    """
+    Subtitle every clip in clips_dir; returns the subtitled video paths.
+    Outputs newer than their inputs are kept, so re-runs only redo what changed.
+
+    With burn=False only the SRTs are written; design.py burns them during its own
+    render, so the intermediate *_subtitled.mp4 can be skipped. Otherwise each
+    clip gets a soft subtitle track, or burned-in captions with BURN_IN.
+    """
+    # Largest (longest) clips first, so the pools don't finish on a long straggler
+    clips = sorted(
+        clips_dir.glob("clip_*.mp4"), key=lambda p: p.stat().st_size, reverse=True
+    )
+    if not clips:
+        return []
+
+    # -------- Process all clips --------
+    workers = min(len(clips), SUBTITLE_WORKERS)
+    if not (burn and BURN_IN):
+        # Soft subtitles: transcribe everything, then one ffmpeg run muxes it all
+        with ThreadPoolExecutor(max_workers=workers) as asr_pool:
+            srt_paths = list(asr_pool.map(write_clip_srt, clips))
+        outputs = sorted(mux_subtitles(list(zip(clips, srt_paths)))) if burn else []
+    else:
+        # Burn-in re-encodes, so it gets its own pool: each clip's encode is queued
+        # as soon as its SRT is written and runs while later clips still transcribe
+        # Probes NVENC once, before the video threads race to do it
+        encoders = encode_workers(workers)
+        with ThreadPoolExecutor(max_workers=workers) as asr_pool, \
+                ThreadPoolExecutor(max_workers=encoders) as video_pool:
+            srt_jobs = {asr_pool.submit(write_clip_srt, clip): clip for clip in clips}
+            video_jobs = [
+                video_pool.submit(burn_subtitles, srt_jobs[job], job.result())
+                for job in as_completed(srt_jobs)
+            ]
+            outputs = sorted(job.result() for job in video_jobs)
+
+    print("🎉 All clips processed with subtitles!")
+    return outputs
+
 
-print("🎉 All clips processed with subtitles!")
\ No newline at end of file
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(
+        description="Transcribe clips to SRT and add them to the clips."
+    )
+    ap.add_argument("--no_burn", action="store_true",
+                    help="Only write SRTs (design.py burns them in its single encode)")
+    run(burn=not ap.parse_args().no_burn)
@@ -0,0 +1,79 @@
+# standard library imports
+import asyncio
+from pathlib import Path
+
+# third party imports
+import pytest
+
+# local imports
+import app as api
+
+
+@pytest.fixture
+def designed_dir(tmp_path: Path, monkeypatch) -> Path:
+    monkeypatch.setattr(api, "DESIGNED_DIR", tmp_path)
+    (tmp_path / "clip_1_vertical.mp4").write_bytes(b"video")
+    (tmp_path / "clip_1.srt").write_bytes(b"1\n00:00:00,000 --> 00:00:01,000\nHi\n\n")
+    (tmp_path / "clip_1.bin").write_bytes(b"data")
+    return tmp_path
+
+
+def _get(path: str):
+    async def request():
+        return await api.app.test_client().get(path)
+    return asyncio.run(request())
+
+
+def _post(path: str, body: dict):
+    async def request():
+        return await api.app.test_client().post(path, json=body)
+    return asyncio.run(request())
+
+
+# Testing /download-file behind nginx (X-Accel-Redirect)
+@pytest.mark.parametrize(
+    "filename, content_type",
+    [
+        ("clip_1_vertical.mp4", "video/mp4"),
+        ("clip_1.bin", "application/octet-stream"),
+    ],
+)
+def test_accel_redirect_download(
+    designed_dir: Path, monkeypatch, filename: str, content_type: str
+):
+    monkeypatch.setattr(api, "ACCEL_REDIRECT_PREFIX", "/private")
+    response = _get(f"/download-file/{filename}?type=designed")
+    assert response.status_code == 200
+    assert response.headers["X-Accel-Redirect"] == f"/private/designed/{filename}"
+    # nginx keeps this header, so it must describe the file, not the empty body
+    assert response.headers["Content-Type"] == content_type
+    assert response.headers["Content-Disposition"] == f"attachment; filename={filename}"
+
+
+def test_accel_redirect_srt_is_not_html(designed_dir: Path, monkeypatch):
+    monkeypatch.setattr(api, "ACCEL_REDIRECT_PREFIX", "/private")
+    response = _get("/download-file/clip_1.srt?type=designed")
+    assert not response.headers["Content-Type"].startswith("text/html")
+
+
+def test_download_missing_file(designed_dir: Path):
+    assert _get("/download-file/missing.mp4?type=designed").status_code == 404
+
+
+# Testing crop_expansion validation
+@pytest.mark.parametrize("value, expected", [(3, 3.0), ("2.5", 2.5), (1.8, 1.8)])
+def test_design_params_casts_crop_expansion(value, expected: float):
+    assert api.design_params({"crop_expansion": value})["crop_expansion"] == expected
+
+
+def test_design_params_default_crop_expansion():
+    assert api.design_params({})["crop_expansion"] == 3.0
+
+
+@pytest.mark.parametrize("path", ["/apply-design", "/process-complete-pipeline"])
+@pytest.mark.parametrize("value", ["wide", None, True, [2], 0, -1.5, "nan"])
+def test_invalid_crop_expansion_rejected(path: str, value):
+    response = _post(path, {"url": "https://example.com/v", "crop_expansion": value})
+    assert response.status_code == 400
+    body = asyncio.run(response.get_json())
+    assert body == {"error": "'crop_expansion' must be a positive number"}
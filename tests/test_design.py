@@ -0,0 +1,73 @@
+# standard library imports
+from pathlib import Path
+
+# third party imports
+import pytest
+
+# local imports
+from design import build_filtergraph
+
+# Graphs produced by the original (pre-caching) build_filtergraph for each case
+_BG_1080 = (
+    "[0:v]scale='if(gte(iw/ih,1080/1920),-1,1080)'"
+    ":'if(gte(iw/ih,1080/1920),1920,-1)',boxblur=24:1,crop=1080:1920[bg],"
+)
+_BG_720 = (
+    "[0:v]scale='if(gte(iw/ih,720/1280),-1,720)'"
+    ":'if(gte(iw/ih,720/1280),1280,-1)',boxblur=24:1,crop=720:1280[bg],"
+)
+_SMART_FG = "[0:v]crop=300:534:10:20[fg],"
+_CENTER_FG = (
+    "[0:v]crop=iw*min(1.0\\,ih/iw*9/16):ih*min(1.0\\,iw/ih*16/9)"
+    ":(iw - iw*min(1.0\\,ih/iw*9/16))/2:(ih - ih*min(1.0\\,iw/ih*16/9))/2[fg],"
+)
+_STYLE = (
+    "force_style='FontName=DejaVu Sans\\,FontSize=13\\,PrimaryColour=&H00FFFFFF&"
+    "\\,BackColour=&H80000000&\\,Outline=0\\,Shadow=0\\,BorderStyle=3"
+    "\\,Alignment=2\\,MarginV=120\\,Bold=1\\,WrapStyle=2'"
+)
+
+
+@pytest.mark.parametrize(
+    "crop_box, out_w, out_h, srt_path, expected",
+    [
+        (
+            (10, 20, 300, 534), 1080, 1920, None,
+            _BG_1080 + _SMART_FG
+            + "[fg]scale=1080:1920:force_original_aspect_ratio=decrease[fgs],"
+            "[bg][fgs]overlay=(W-w)/2:(H-h)/2[base],"
+            "[base][1:v]overlay=0:0[outv]",
+        ),
+        (
+            None, 1080, 1920, None,
+            _BG_1080 + _CENTER_FG
+            + "[fg]scale=1080:1920:force_original_aspect_ratio=decrease[fgs],"
+            "[bg][fgs]overlay=(W-w)/2:(H-h)/2[base],"
+            "[base][1:v]overlay=0:0[outv]",
+        ),
+        (
+            (10, 20, 300, 534), 1080, 1920, Path("/media/my clips/a,b:c's.srt"),
+            _BG_1080 + _SMART_FG
+            + "[fg]scale=1080:1920:force_original_aspect_ratio=decrease[fgs],"
+            "[bg][fgs]overlay=(W-w)/2:(H-h)/2[base],"
+            "[base]subtitles='/media/my clips/a\\,b\\:c\\'s.srt':" + _STYLE
+            + "[base2],[base2][1:v]overlay=0:0[outv]",
+        ),
+        (
+            None, 720, 1280, Path("/home/u/subtitled/clip_1.srt"),
+            _BG_720 + _CENTER_FG
+            + "[fg]scale=720:1280:force_original_aspect_ratio=decrease[fgs],"
+            "[bg][fgs]overlay=(W-w)/2:(H-h)/2[base],"
+            "[base]subtitles='/home/u/subtitled/clip_1.srt':" + _STYLE
+            + "[base2],[base2][1:v]overlay=0:0[outv]",
+        ),
+    ],
+)
+def test_build_filtergraph_matches_baseline(crop_box, out_w, out_h, srt_path, expected):
+    assert build_filtergraph(crop_box, out_w, out_h, srt_path) == expected
+
+
+def test_build_filtergraph_ignores_degenerate_crop_box():
+    assert build_filtergraph((0, 0, 0, 0), 1080, 1920, None) == build_filtergraph(
+        None, 1080, 1920, None
+    )
@@ -0,0 +1,130 @@
+# standard library imports
+import os
+import sys
+from pathlib import Path
+
+# third party imports
+import pytest
+
+# local imports
+import pipeline_utils
+from pipeline_utils import (
+    CommandError,
+    cached_list_directory_files,
+    encode_workers,
+    get_file_info,
+    invalidate_listing_cache,
+    list_directory_files,
+    remove_files,
+    run_command,
+)
+
+
+@pytest.fixture
+def media_dir(tmp_path: Path) -> Path:
+    for name in ["clip_2.mp4", "clip_1.mp4", "clip_1.srt", "notes.txt", ".clip_3.mp4"]:
+        (tmp_path / name).write_bytes(b"x" * 1024)
+    (tmp_path / "clip_dir.mp4").mkdir()
+    return tmp_path
+
+
+@pytest.fixture(autouse=True)
+def empty_listing_cache():
+    invalidate_listing_cache()
+    yield
+    invalidate_listing_cache()
+
+
+# Testing remove_files
+def test_remove_files_by_prefix_and_suffix(media_dir: Path):
+    assert remove_files(media_dir, "clip_", ".mp4") == 2
+    assert sorted(p.name for p in media_dir.iterdir()) == [
+        ".clip_3.mp4", "clip_1.srt", "clip_dir.mp4", "notes.txt"
+    ]
+
+
+def test_remove_files_suffix_tuple(media_dir: Path):
+    assert remove_files(media_dir, suffix=(".mp4", ".srt")) == 3
+    assert (media_dir / "notes.txt").exists()
+
+
+def test_remove_files_skips_hidden_files_and_dirs(media_dir: Path):
+    remove_files(media_dir)
+    remaining = sorted(p.name for p in media_dir.iterdir())
+    assert remaining == [".clip_3.mp4", "clip_dir.mp4"]
+
+
+# Testing list_directory_files
+def test_list_directory_files_sorted_and_filtered(media_dir: Path):
+    files = list_directory_files(media_dir, "clip_*.mp4")
+    assert [f["filename"] for f in files] == ["clip_1.mp4", "clip_2.mp4"]
+    assert files[0]["path"] == str(media_dir / "clip_1.mp4")
+    assert files[0]["size_mb"] == 0.0
+
+
+def test_list_directory_files_all(media_dir: Path):
+    names = [f["filename"] for f in list_directory_files(media_dir)]
+    assert names == ["clip_1.mp4", "clip_1.srt", "clip_2.mp4", "notes.txt"]
+
+
+def test_get_file_info_missing(tmp_path: Path):
+    assert get_file_info(tmp_path / "missing.mp4") is None
+
+
+# Testing cached_list_directory_files
+def test_cached_listing_served_while_directory_unchanged(media_dir: Path):
+    first = cached_list_directory_files(media_dir, "*.mp4")
+    assert cached_list_directory_files(media_dir, "*.mp4") is first
+
+
+def test_cached_listing_refreshed_when_directory_changes(media_dir: Path):
+    cached_list_directory_files(media_dir, "*.mp4")
+    (media_dir / "clip_4.mp4").write_bytes(b"")
+    # pin a distinct directory mtime: coarse timestamps could otherwise hide the write
+    st = media_dir.stat()
+    os.utime(media_dir, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    names = [f["filename"] for f in cached_list_directory_files(media_dir, "*.mp4")]
+    assert "clip_4.mp4" in names
+
+
+def test_cached_listing_expires_after_ttl(media_dir: Path, monkeypatch):
+    first = cached_list_directory_files(media_dir, "*.mp4")
+    monkeypatch.setattr(pipeline_utils, "LISTING_CACHE_TTL", 0.0)
+    assert cached_list_directory_files(media_dir, "*.mp4") is not first
+
+
+def test_invalidate_listing_cache_for_one_directory(media_dir: Path, tmp_path_factory):
+    other = tmp_path_factory.mktemp("other")
+    first = cached_list_directory_files(media_dir)
+    other_first = cached_list_directory_files(other)
+    invalidate_listing_cache(media_dir)
+    assert cached_list_directory_files(media_dir) is not first
+    assert cached_list_directory_files(other) is other_first
+
+
+# Testing run_command
+def test_run_command_success():
+    run_command([sys.executable, "-c", "print('ok')"])
+
+
+def test_run_command_failure_keeps_output_tail():
+    script = "import sys\nfor i in range(10): print(i)\nsys.exit(3)"
+    with pytest.raises(CommandError) as exc_info:
+        run_command([sys.executable, "-c", script], tail_lines=3)
+    assert exc_info.value.returncode == 3
+    assert exc_info.value.output == "7\n8\n9\n"
+    assert str(exc_info.value).endswith("7\n8\n9\n")
+
+
+# Testing encode_workers
+def test_encode_workers_capped_to_nvenc_sessions(monkeypatch):
+    monkeypatch.setattr(pipeline_utils, "nvenc_available", lambda: True)
+    monkeypatch.setattr(pipeline_utils, "NVENC_SESSIONS", 3)
+    assert encode_workers(16) == 3
+    assert encode_workers(2) == 2
+
+
+def test_encode_workers_uncapped_on_cpu(monkeypatch):
+    monkeypatch.setattr(pipeline_utils, "nvenc_available", lambda: False)
+    monkeypatch.setattr(pipeline_utils, "NVENC_SESSIONS", 3)
+    assert encode_workers(16) == 16
@@ -0,0 +1,175 @@
+# standard library imports
+import os
+import re
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+# third party imports
+import numpy as np
+import pytest
+
+# local imports
+import subtitles
+
+# Any clip with a minute or so of continuous, multi-sentence speech
+SPEECH_CLIP = os.environ.get("CLIPSAI_TEST_SPEECH_CLIP", "")
+
+_CUE_TIMES = re.compile(
+    r"(\d\d):(\d\d):(\d\d),(\d\d\d) --> (\d\d):(\d\d):(\d\d),(\d\d\d)"
+)
+
+
+def _seconds(h: str, m: str, s: str, ms: str) -> float:
+    return int(h) * 3600 + int(m) * 60 + int(s) + int(ms) / 1000
+
+
+def _cue_durations(srt_text: str) -> list:
+    return [
+        _seconds(*match.groups()[4:]) - _seconds(*match.groups()[:4])
+        for match in _CUE_TIMES.finditer(srt_text)
+    ]
+
+
+@pytest.fixture
+def fake_pipeline():
+    pipeline = MagicMock()
+    pipeline.transcribe.return_value = (
+        [
+            SimpleNamespace(start=0.0, end=2.5, text=" Hello there."),
+            SimpleNamespace(start=2.5, end=4.04, text=" How are you? "),
+        ],
+        None,
+    )
+    with patch.object(subtitles, "WHISPER_CPP", ""), patch(
+        "subtitles.decode_audio", return_value=np.zeros(16000 * 5, dtype=np.float32)
+    ), patch(
+        "subtitles.get_speech_timestamps",
+        return_value=[{"start": 0, "end": 16000 * 5}],
+    ), patch(
+        "subtitles.get_pipeline", return_value=pipeline
+    ):
+        yield pipeline
+
+
+def test_transcribe_requests_timestamp_tokens(fake_pipeline, tmp_path: Path):
+    subtitles.transcribe_to_srt(Path("clip_1.mp4"), tmp_path / "clip_1.srt")
+    # without timestamp tokens the batched pipeline emits one cue per VAD chunk
+    assert fake_pipeline.transcribe.call_args.kwargs["without_timestamps"] is False
+
+
+def test_transcribe_decodes_greedily(fake_pipeline, tmp_path: Path):
+    subtitles.transcribe_to_srt(Path("clip_1.mp4"), tmp_path / "clip_1.srt")
+    # beam_size is the only decode option the batched pipeline honours (default 5)
+    assert fake_pipeline.transcribe.call_args.kwargs["beam_size"] == 1
+
+
+def test_transcribe_writes_srt(fake_pipeline, tmp_path: Path):
+    srt_path = tmp_path / "clip_1.srt"
+    subtitles.transcribe_to_srt(Path("clip_1.mp4"), srt_path)
+    assert srt_path.read_bytes().decode("utf-8") == (
+        "1\n00:00:00,000 --> 00:00:02,500\nHello there.\n\n"
+        "2\n00:00:02,500 --> 00:00:04,040\nHow are you?\n\n"
+    )
+
+
+def test_transcribe_skips_clips_without_speech(fake_pipeline, tmp_path: Path):
+    srt_path = tmp_path / "clip_1.srt"
+    with patch("subtitles.get_speech_timestamps", return_value=[]):
+        subtitles.transcribe_to_srt(Path("clip_1.mp4"), srt_path)
+    assert srt_path.read_bytes() == b""
+    fake_pipeline.transcribe.assert_not_called()
+
+
+@pytest.mark.skipif(
+    not SPEECH_CLIP,
+    reason="set CLIPSAI_TEST_SPEECH_CLIP to a clip with multi-sentence speech",
+)
+def test_cues_are_sentence_length(tmp_path: Path):
+    srt_path = tmp_path / "clip.srt"
+    subtitles.transcribe_to_srt(Path(SPEECH_CLIP), srt_path)
+    durations = _cue_durations(srt_path.read_text(encoding="utf-8"))
+    assert len(durations) > 1
+    # openai-whisper's cues run a few seconds; whole 30 s VAD chunks would not
+    assert max(durations) <= 15.0
+
+
+# Testing _fmt
+@pytest.mark.parametrize(
+    "seconds, expected",
+    [
+        (0.0, "00:00:00,000"),
+        (0.999, "00:00:00,999"),
+        (59.5, "00:00:59,500"),
+        (61.25, "00:01:01,250"),
+        (3725.042, "01:02:05,042"),
+        (36000.0, "10:00:00,000"),
+    ],
+)
+def test_fmt(seconds: float, expected: str):
+    assert subtitles._fmt(seconds) == expected
+
+
+# Testing mux_subtitles
+@pytest.fixture
+def mux_dirs(tmp_path: Path, monkeypatch):
+    clips = tmp_path / "clips"
+    clips.mkdir()
+    subs = tmp_path / "subtitled"
+    subs.mkdir()
+    monkeypatch.setattr(subtitles, "subs_dir", subs)
+    (clips / "clip_1.mp4").write_bytes(b"video")
+    (clips / "clip_2.mp4").write_bytes(b"video")
+    (subs / "clip_1.srt").write_bytes(b"1\n00:00:00,000 --> 00:00:01,000\nHi\n\n")
+    (subs / "clip_2.srt").write_bytes(b"")  # no speech
+    return clips, subs
+
+
+def _fake_ffmpeg(calls: list):
+    def run(cmd):
+        calls.append(cmd)
+        for arg in cmd:
+            if arg.endswith(".part"):
+                Path(arg).write_bytes(b"muxed")
+    return run
+
+
+def test_mux_subtitles_single_ffmpeg_run(mux_dirs):
+    clips, subs = mux_dirs
+    calls = []
+    pairs = [
+        (clips / "clip_1.mp4", subs / "clip_1.srt"),
+        (clips / "clip_2.mp4", subs / "clip_2.srt"),
+    ]
+    with patch("subtitles.run_command", _fake_ffmpeg(calls)):
+        outputs = subtitles.mux_subtitles(pairs)
+
+    assert outputs == [subs / "clip_1_subtitled.mp4", subs / "clip_2_subtitled.mp4"]
+    assert calls == [[
+        "ffmpeg", "-y", "-nostdin", "-loglevel", "error",
+        "-i", str(clips / "clip_1.mp4"),
+        "-i", str(subs / "clip_1.srt"),
+        "-i", str(clips / "clip_2.mp4"),
+        "-map", "0:v", "-map", "0:a?", "-c", "copy",
+        "-map", "1:0", "-c:s", "mov_text", "-metadata:s:s:0", "language=eng",
+        "-f", "mp4", str(subs / "clip_1_subtitled.mp4.part"),
+        # the empty SRT is left out: ffmpeg can't open it
+        "-map", "2:v", "-map", "2:a?", "-c", "copy",
+        "-f", "mp4", str(subs / "clip_2_subtitled.mp4.part"),
+    ]]
+    assert all(out.read_bytes() == b"muxed" for out in outputs)
+    assert not list(subs.glob("*.part"))
+
+
+def test_mux_subtitles_skips_up_to_date_outputs(mux_dirs):
+    clips, subs = mux_dirs
+    out = subs / "clip_1_subtitled.mp4"
+    out.write_bytes(b"done")
+    newer = (subs / "clip_1.srt").stat().st_mtime + 10
+    os.utime(out, (newer, newer))
+    calls = []
+    with patch("subtitles.run_command", _fake_ffmpeg(calls)):
+        outputs = subtitles.mux_subtitles([(clips / "clip_1.mp4", subs / "clip_1.srt")])
+    assert outputs == [out]
+    assert calls == []
+    assert out.read_bytes() == b"done"
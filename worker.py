@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+"""
+RQ worker for the pipeline jobs with the models preloaded
+
+The models are loaded once at startup and jobs run in this same process
+(SimpleWorker), so they stay resident between jobs. A forking worker would
+reload them in every work horse, and a CUDA context cannot survive fork anyway.
+"""
+
+import logging
+
+from redis import Redis
+from rq import Queue, SimpleWorker
+
+from pipeline_utils import REDIS_URL
+import pipeline_tasks
+
+logging.basicConfig(level=logging.INFO)
+
+if __name__ == "__main__":
+    pipeline_tasks.warm_models()
+    connection = Redis.from_url(REDIS_URL)
+    worker = SimpleWorker(
+        [Queue("clipsai", connection=connection)], connection=connection
+    )
+    worker.work()